@@ -7,6 +7,8 @@ load_dotenv()
 # Gemini API Configuration
 GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 GEMINI_MODEL = "gemini-2.5-flash-lite"
+# gRPC keeps one long-lived HTTP/2 channel per client and multiplexes requests over it
+GEMINI_TRANSPORT = "grpc"
 
 # OpenAI API Configuration (for Whisper STT, etc.)
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
@@ -1,3 +1,4 @@
+import concurrent.futures
 import logging
 from .model import ModelManager
 from .memory import MedicalMemoryManager
@@ -9,64 +10,73 @@ model_manager = ModelManager()
 memory_manager = MedicalMemoryManager()
 conversation_turns = 0
 
+# Overlaps independent Gemini round-trips (Phase 2 summary + medicine)
+_EXECUTOR = concurrent.futures.ThreadPoolExecutor(max_workers=4)
 
-def build_gemini_prompt(system_prompt, history, user_input):
+
+def build_gemini_turns(history, user_input):
     """
-    Build a comprehensive prompt for Gemini API that includes system instructions,
-    conversation history, and memory context.
+    Build the conversation turns for a Gemini chat request. Everything that
+    changes from turn to turn (memory context and the new input) goes into
+    the final user message, after the static system prompt and the earlier
+    exchanges.
+    
+    Returns:
+        (recent_history, user_message) for ModelManager.generate_chat_stream
     """
     memory_context = memory_manager.get_memory_context()
     
-    # Build the full prompt with context
-    prompt = f"{system_prompt}\n\n"
-    
-    if memory_context:
-        prompt += f"Previous conversation context:\n{memory_context}\n\n"
-    
     # Add recent history (last 3 exchanges for context)
     recent_history = history[-3:] if len(history) > 3 else history
     
-    if recent_history:
-        prompt += "Recent conversation:\n"
-        for user_msg, assistant_msg in recent_history:
-            prompt += f"Patient: {user_msg}\n"
-            if assistant_msg:
-                prompt += f"Doctor: {assistant_msg}\n"
-        prompt += "\n"
+    parts = []
+    if memory_context:
+        parts.append(f"Previous conversation context:\n{memory_context}\n\n")
     
     # Add current user input
-    prompt += f"Patient: {user_input}\n\nDoctor:"
+    parts.append(f"Patient: {user_input}")
     
-    return prompt
+    return recent_history, "".join(parts)
 
 
 def respond(message, chat_history):
     """
-    Main response handler that manages the consultation flow
+    Main response handler that manages the consultation flow.
+    Yields ("", chat_history) every time the reply grows, so the UI can show
+    it while Gemini is still generating.
     """
     global conversation_turns
     conversation_turns += 1
     
     logging.info(f"Turn {conversation_turns} - User input: {message}")
+    history_len = len(chat_history)
     
     try:
         # Import prompts here to avoid circular imports
-        from .prompts import CONSULTATION_PROMPT, MEDICINE_PROMPT
+        from .prompts import CONSULTATION_PROMPT, render_medicine_prompt
         
         # Phase 1: Information Gathering (first 3 turns)
         if conversation_turns < 4:
             logging.info("Phase 1: Information gathering with CONSULTATION_PROMPT")
             
-            prompt = build_gemini_prompt(CONSULTATION_PROMPT, chat_history, message)
-            response = model_manager.generate(prompt, max_new_tokens=256, temperature=0.7)
+            turns, user_turn = build_gemini_turns(chat_history, message)
+            
+            # Stream the reply into the last history entry as chunks arrive
+            response = ""
+            chat_history.append((message, response))
+            for chunk in model_manager.generate_chat_stream(
+                CONSULTATION_PROMPT, turns, user_turn, max_new_tokens=256, temperature=0.7
+            ):
+                response += chunk
+                chat_history[-1] = (message, response)
+                yield "", chat_history
             
             logging.info(f"Model response: {response[:100]}...")
             
             # Store interaction in memory
             memory_manager.add_interaction(message, response)
-            chat_history.append((message, response))
             
-            return "", chat_history
+            yield "", chat_history
         
         # Phase 2: Summary and Recommendations (turn 4 onwards)
         else:
@@ -76,24 +86,26 @@ def respond(message, chat_history):
             patient_summary = memory_manager.get_patient_summary()
             memory_context = memory_manager.get_memory_context()
             
-            # Generate comprehensive summary
-            summary_prompt = build_gemini_prompt(
-                CONSULTATION_PROMPT + "\n\nNow provide a comprehensive summary of all the information gathered. Include assessment of severity and when professional care may be needed.",
-                chat_history,
-                message
+            # Generate comprehensive summary from the patient memory alone; it
+            # already captures the consultation, so no system prompt or history
+            summary_prompt = (
+                "Based on the following patient data, give a concise medical assessment "
+                "including severity and when professional care is needed.\n\n"
+                f"{patient_summary}\n\nLatest concern: {message}\n\nAssessment:"
             )
             
-            logging.info("Generating summary...")
-            summary = model_manager.generate(summary_prompt, max_new_tokens=500, temperature=0.7)
-            logging.info(f"Summary generated: {summary[:100]}...")
-            
-            # Generate medicine and care suggestions
-            full_patient_info = f"Patient Summary: {patient_summary}\n\nDetailed Assessment: {summary}"
-            
-            med_prompt = f"{MEDICINE_PROMPT.format(patient_info=full_patient_info, memory_context=memory_context)}"
+            # Medicine suggestions only depend on the patient memory, so both
+            # requests can be sent to Gemini at the same time
+            med_prompt = render_medicine_prompt(
+                patient_info=f"Patient Summary: {patient_summary}",
+                memory_context=memory_context
+            )
             
-            logging.info("Generating medicine and care suggestions...")
-            medicine_suggestions = model_manager.generate(med_prompt, max_new_tokens=400, temperature=0.7)
+            logging.info("Generating summary and medicine suggestions concurrently...")
+            f_sum = _EXECUTOR.submit(model_manager.generate, summary_prompt, max_new_tokens=500, temperature=0.7)
+            f_med = _EXECUTOR.submit(model_manager.generate, med_prompt, max_new_tokens=400, temperature=0.7)
+            summary, medicine_suggestions = f_sum.result(), f_med.result()
+            logging.info(f"Summary generated: {summary[:100]}...")
             logging.info(f"Medicine suggestions generated: {medicine_suggestions[:100]}...")
             
             # Combine all responses
@@ -109,7 +121,7 @@ def respond(message, chat_history):
             memory_manager.add_interaction(message, final_response)
             chat_history.append((message, final_response))
             
-            return "", chat_history
+            yield "", chat_history
     
     except Exception as e:
         logging.error(f"Error in respond function: {e}")
@@ -118,8 +130,10 @@ def respond(message, chat_history):
             "This could be due to API connectivity issues. Please try again in a moment. "
             f"Error details: {str(e)}"
         )
+        # Drop a partially streamed reply before adding the error
+        del chat_history[history_len:]
         chat_history.append((message, error_message))
-        return "", chat_history
+        yield "", chat_history
 
 
 def reset_chat():
@@ -1,17 +1,32 @@
 import gradio as gr
+import asyncio
+import queue
 import threading
 import re
-import requests
+import aiohttp
 import sounddevice as sd
 import soundfile as sf
-import tempfile
 import io
 import numpy as np 
-from scipy.io.wavfile import write as wav_write
 
 from .handlers import respond, reset_chat
 from .config import NGROK_URL, VOICE_SAMPLE_RATE, VOICE_CHANNELS
 
+_EXTRACT_RE = re.compile(r'<td class="message-text"[^>]*>([\s\S]*?)</td>')
+
+# Frames per TTS playback block (~85 ms of gTTS' 24 kHz audio)
+_TTS_BLOCKSIZE = 2048
+
+
+async def _iterate_in_thread(iterator):
+    """Steps through a blocking iterator in a worker thread, yielding each item."""
+    done = object()
+    while True:
+        item = await asyncio.to_thread(next, iterator, done)
+        if item is done:
+            return
+        yield item
+
 
 class VoiceEnhancedInterface:
     def __init__(self):
@@ -23,10 +38,18 @@ class VoiceEnhancedInterface:
             
         self.is_bot_speaking = False         # True when TTS playback is active
         self.is_recording = False            # True while mic is recording
+        self._stop_recording = threading.Event()  # set to end the current recording
         self._record_thread = None
         self._last_transcript = ""           # populated after recording stops
         self.samplerate = VOICE_SAMPLE_RATE  # Load from config
+        # Recording buffer (60 s of mono int16, grown on demand) and fill index
+        self._rec_buf = np.empty(self.samplerate * 60, dtype=np.int16)
+        self._rec_idx = 0
         self.conversation_mode = False
+        self._stt_future = None              # transcription started by the record worker
+        self._ui_loop = None                 # event loop the STT upload runs on
+        self._http = None                    # shared aiohttp session (see _get_http)
+        self._tts_task = None                # background TTS task
 
     # --- Message Formatting (unchanged) ---
     def _format_message(self, text):
@@ -44,39 +67,54 @@ class VoiceEnhancedInterface:
         """Extracts the original raw text from our HTML structure."""
         if not isinstance(formatted_text, str):
             return str(formatted_text)
-        match = re.search(r'<td class="message-text"[^>]*>([\s\S]*?)</td>', formatted_text)
+        match = _EXTRACT_RE.search(formatted_text)
         return match.group(1).strip() if match else formatted_text
 
+    # --- Shared HTTP session for the ngrok endpoints ---
+    def _get_http(self):
+        """Returns the keep-alive aiohttp session, creating it on the running event loop."""
+        if self._http is None or self._http.closed:
+            self._http = aiohttp.ClientSession(
+                # every call goes to the one ngrok host, so cap what it may hold open
+                connector=aiohttp.TCPConnector(limit=20, limit_per_host=8, keepalive_timeout=60),
+                timeout=aiohttp.ClientTimeout(total=60),
+            )
+        return self._http
+
     # --- STT via ngrok ---
-    def transcribe_audio(self, wav_path):
-        """Send recorded audio to /transcribe endpoint via ngrok."""
+    async def transcribe_audio(self, audio):
+        """Send recorded audio (a file-like WAV) to /transcribe endpoint via ngrok."""
         try:
-            with open(wav_path, "rb") as f:
-                resp = requests.post(f"{self.NGROK_URL}/transcribe", files={"file": f}, timeout=60)
-            if resp.status_code == 200:
-                return resp.json().get("text", "")
-            else:
-                print("Transcribe failed:", resp.status_code, resp.text)
-                return ""
+            form = aiohttp.FormData()
+            form.add_field("file", audio, filename="audio.wav", content_type="audio/wav")
+            async with self._get_http().post(f"{self.NGROK_URL}/transcribe", data=form) as resp:
+                if resp.status == 200:
+                    return (await resp.json()).get("text", "")
+                else:
+                    print("Transcribe failed:", resp.status, await resp.text())
+                    return ""
         except Exception as e:
             print("STT Error:", e)
             return ""
 
     # --- TTS via ngrok (fetch mp3, play via sounddevice) ---
-    def _fetch_tts_bytes(self, text):
-        """Fetch MP3 bytes from the TTS endpoint and convert to numpy audio."""
+    async def _fetch_tts_bytes(self, text):
+        """Fetch MP3 bytes from the TTS endpoint as a seekable buffer for sf.SoundFile."""
         try:
-            resp = requests.post(f"{self.NGROK_URL}/speak", data={"text": text}, timeout=60)
-            if resp.status_code == 200:
-                return io.BytesIO(resp.content)
-            else:
-                print("TTS fetch failed:", resp.status_code, resp.text)
-                return None
+            async with self._get_http().post(f"{self.NGROK_URL}/speak", data={"text": text}) as resp:
+                if resp.status == 200:
+                    # The whole body is buffered on purpose: libsndfile needs a seekable
+                    # source (it reads the length and probes the end of the MP3), so
+                    # decoding cannot start from a half-downloaded response stream.
+                    return io.BytesIO(await resp.read())
+                else:
+                    print("TTS fetch failed:", resp.status, await resp.text())
+                    return None
         except Exception as e:
             print("TTS request error:", e)
             return None
         
-    def speak_text(self, text):
+    async def speak_text(self, text):
         """Toggleable TTS playback with smooth streaming audio."""
         try:
             # --- Stop if already speaking ---
@@ -87,27 +125,60 @@ class VoiceEnhancedInterface:
                 return
 
             # --- Fetch audio bytes ---
-            tts_bytes = self._fetch_tts_bytes(text)
+            tts_bytes = await self._fetch_tts_bytes(text)
             if not tts_bytes:
                 return
 
-            # --- Read MP3 into float32 array ---
-            data, sr = sf.read(tts_bytes, dtype="float32")
-
             # --- Begin playback in background thread ---
             self.is_bot_speaking = True
             print("🔊 Starting smooth TTS playback...")
 
             def play_worker():
                 try:
-                    with sd.OutputStream(samplerate=sr, channels=data.shape[1] if len(data.shape) > 1 else 1) as stream:
-                        block_size = 4096
-                        i = 0
-                        while self.is_bot_speaking and i < len(data):
-                            end = min(i + block_size, len(data))
-                            stream.write(data[i:end])
-                            i = end
-                        stream.stop()
+                    # Decode the MP3 block by block instead of holding the whole float32 buffer
+                    with sf.SoundFile(tts_bytes) as snd:
+                        finished = threading.Event()
+                        # Decoding happens here, not in the real-time callback, which
+                        # only copies ready blocks (None marks the end of the audio)
+                        blocks = queue.Queue(maxsize=16)
+
+                        def callback(outdata, frames, time_info, status):
+                            if not self.is_bot_speaking:
+                                # toggled off: silence this buffer and drop the queued ones
+                                outdata.fill(0)
+                                raise sd.CallbackAbort
+                            try:
+                                block = blocks.get_nowait()
+                            except queue.Empty:
+                                outdata.fill(0)  # decoder fell behind; play silence
+                                return
+                            if block is None:
+                                outdata.fill(0)
+                                raise sd.CallbackStop
+                            outdata[:len(block)] = block
+                            if len(block) < frames:
+                                outdata[len(block):] = 0
+                                raise sd.CallbackStop
+
+                        def feed(item):
+                            # hand one item to the callback unless playback has ended
+                            while self.is_bot_speaking and not finished.is_set():
+                                try:
+                                    blocks.put(item, timeout=0.1)
+                                    return True
+                                except queue.Full:
+                                    pass
+                            return False
+
+                        with sd.OutputStream(samplerate=snd.samplerate, channels=snd.channels, dtype="float32",
+                                             blocksize=_TTS_BLOCKSIZE, callback=callback,
+                                             finished_callback=finished.set):
+                            for block in snd.blocks(blocksize=_TTS_BLOCKSIZE, dtype="float32", always_2d=True):
+                                if not feed(block):
+                                    break
+                            else:
+                                feed(None)
+                            finished.wait()
                 except Exception as e:
                     print("Playback error:", e)
                 finally:
@@ -123,9 +194,9 @@ class VoiceEnhancedInterface:
 
 
     # --- Chat Logic (same behavior, removed auto-speak) ---
-    def user_message_handler(self, user_message, chat_history):
+    def user_message_handler(self, user_message, chat_history, raw_history):
         if not user_message.strip():
-            return "", chat_history
+            return "", chat_history, raw_history
         # interrupt TTS if user sends new text
         if self.is_bot_speaking:
             sd.stop()
@@ -133,25 +204,32 @@ class VoiceEnhancedInterface:
 
         formatted_user_msg = self._format_message(user_message)
         chat_history.append((formatted_user_msg, None))
-        return "", chat_history
+        raw_history.append((user_message, None))
+        return "", chat_history, raw_history
 
-    def bot_response_handler(self, chat_history):
+    async def bot_response_handler(self, chat_history, raw_history):
         if not chat_history or chat_history[-1][1] is not None:
-            return chat_history
-
-        formatted_user_msg = chat_history[-1][0]
-        raw_user_msg = self._extract_text(formatted_user_msg)
+            yield chat_history, raw_history
+            return
 
-        raw_history = [
-            (self._extract_text(q), self._extract_text(a))
-            for q, a in chat_history[:-1] if q and a
-        ]
+        # raw_history is this session's gr.State and may grow while we stream
+        # (user_message_handler is not queued), so pin the pending entry now
+        idx = len(raw_history) - 1
+        if idx < 0 or raw_history[idx][1] is not None:
+            yield chat_history, raw_history
+            return
 
-        _, updated_raw_history = respond(raw_user_msg, raw_history)
-        raw_bot_response = updated_raw_history[-1][1]
+        formatted_user_msg = chat_history[-1][0]
+        raw_user_msg = raw_history[idx][0]
 
-        formatted_bot_response = self._format_message(raw_bot_response)
-        chat_history[-1] = (formatted_user_msg, formatted_bot_response)
+        # Show the reply as it streams in from respond()
+        raw_bot_response = ""
+        async for _, updated_raw_history in _iterate_in_thread(respond(raw_user_msg, raw_history[:idx])):
+            raw_bot_response = updated_raw_history[-1][1]
+            formatted_bot_response = self._format_message(raw_bot_response)
+            chat_history[-1] = (formatted_user_msg, formatted_bot_response)
+            yield chat_history, raw_history
+        raw_history[idx] = (raw_user_msg, raw_bot_response)
 
         # 🔊 Auto-speak if conversation mode is ON
         if self.conversation_mode:
@@ -161,87 +239,91 @@ class VoiceEnhancedInterface:
                 sd.stop()
                 self.is_bot_speaking = False
             # run speaking in background
-            threading.Thread(
-                target=self.speak_text,
-                args=(raw_bot_response,),
-                daemon=True
-            ).start()
-
-        return chat_history
+            self._tts_task = asyncio.create_task(self.speak_text(raw_bot_response))
 
 
     # ---------------------------
     # RECORDING: start / stop
     # ---------------------------
-    def handle_voice_input(self, chat_history):
+    async def handle_voice_input(self, chat_history, raw_history):
         """
         This function is wired to the mic button.
         - First click: starts recording in background and returns a "Recording..." message.
         - Second click: signals the recording thread to stop, waits for it to finish,
                        then returns the transcribed text appended to chat_history.
-        Returns a tuple matching Gradio outputs wired in your app: (msg_value, chat_history)
+        Returns a tuple matching Gradio outputs wired in your app: (msg_value, chat_history, raw_history)
         """
         if not self.is_recording:
             # start background recording thread
             self.is_recording = True
+            self._stop_recording.clear()
             self._last_transcript = ""
+            self._stt_future = None
+            self._ui_loop = asyncio.get_running_loop()
             self._record_thread = threading.Thread(target=self._record_worker, daemon=True)
             self._record_thread.start()
             # return a message visible in the text input (you used msg as output before)
-            return "🎙️ Recording... Click mic again to stop.", chat_history
+            return "🎙️ Recording... Click mic again to stop.", chat_history, raw_history
         else:
             # stop recording and wait for worker to finish
             self.is_recording = False
+            self._stop_recording.set()
             if self._record_thread is not None:
-                self._record_thread.join(timeout=30)  # avoid infinite hang
+                await asyncio.to_thread(self._record_thread.join, 30)  # avoid infinite hang
+            if self._stt_future is not None:
+                try:
+                    self._last_transcript = await asyncio.wait_for(asyncio.wrap_future(self._stt_future), timeout=30) or ""
+                except asyncio.TimeoutError:
+                    print("STT Error: transcription timed out")
             # if we got a transcript, treat it like user input
             transcript = getattr(self, "_last_transcript", "") or ""
             if transcript:
                 # append user message and then generate bot reply (like in old flow)
-                return self.user_message_handler(transcript, chat_history)
+                return self.user_message_handler(transcript, chat_history, raw_history)
             else:
                 # no clear transcript
                 chat_history.append(("Voice input error", "Sorry, I couldn't hear clearly."))
-                return "", chat_history
+                return "", chat_history, raw_history
 
     def _record_worker(self):
-        """Background worker that records until self.is_recording becomes False,
-           then writes WAV, calls transcribe_audio, and stores transcript in self._last_transcript.
+        """Background worker that records until self._stop_recording is set,
+           then encodes it as an in-memory WAV and starts its transcription (self._stt_future).
         """
-        frames = []
+        self._rec_idx = 0
         try:
             # Use blocking InputStream with callback to collect frames
             def callback(indata, frames_count, time_info, status):
-                # append copy of indata (numPy array)
-                frames.append(indata.copy())
-
-            with sd.InputStream(samplerate=self.samplerate, channels=VOICE_CHANNELS, callback=callback):
-                # spin until user stops recording
-                while self.is_recording:
-                    sd.sleep(100)
+                # copy the (mono) block straight into the preallocated buffer
+                end = self._rec_idx + frames_count
+                if end > len(self._rec_buf):
+                    self._rec_buf = np.resize(self._rec_buf, max(end, 2 * len(self._rec_buf)))
+                self._rec_buf[self._rec_idx:end] = indata[:, 0]
+                self._rec_idx = end
+
+            # capture 16-bit PCM directly; that is all the STT endpoint needs
+            with sd.InputStream(samplerate=self.samplerate, channels=VOICE_CHANNELS, dtype="int16", callback=callback):
+                # block until user stops recording
+                self._stop_recording.wait()
         except Exception as e:
             print("Recording error:", e)
 
-        # combine frames into a single numpy array (shape: samples x channels)
-        if len(frames) == 0:
-            self._last_transcript = ""
+        if self._rec_idx == 0:
             return
         try:
-            audio_np = np.concatenate(frames, axis=0)
-            # write to temporary wav file
-            with tempfile.NamedTemporaryFile(delete=False, suffix=".wav") as tmp:
-                wav_write(tmp.name, self.samplerate, audio_np)
-                # send to transcribe
-                text = self.transcribe_audio(tmp.name)
-                self._last_transcript = text or ""
+            audio_np = self._rec_buf[:self._rec_idx]
+            # encode as 16-bit WAV in memory (no temp file round-trip)
+            buf = io.BytesIO()
+            sf.write(buf, audio_np, self.samplerate, format="WAV", subtype="PCM_16")
+            buf.seek(0)
+            # start the upload now, without waiting for the handler to resume
+            self._stt_future = asyncio.run_coroutine_threadsafe(self.transcribe_audio(buf), self._ui_loop)
         except Exception as e:
             print("Error processing recorded audio:", e)
-            self._last_transcript = ""
 
     # ---------------------------
     # Click-to-speak per message
     # ---------------------------
-    def speak_selected_message(self, evt: gr.SelectData):
+    async def speak_selected_message(self, evt: gr.SelectData):
         """
         This is triggered when a user clicks any message in the Chatbot.
         It extracts the message text and toggles playback for that message.
@@ -252,10 +334,18 @@ class VoiceEnhancedInterface:
             if not text_to_speak:
                 return
             # run TTS in background to avoid blocking UI
-            threading.Thread(target=self.speak_text, args=(text_to_speak,), daemon=True).start()
+            self._tts_task = asyncio.create_task(self.speak_text(text_to_speak))
         except Exception as e:
             print("speak_selected_message error:", e)
 
+    # ---------------------------
+    # New consultation
+    # ---------------------------
+    def reset_handler(self):
+        """Starts a new consultation and clears the raw-text history."""
+        chat_history, msg_value = reset_chat()
+        return chat_history, msg_value, []
+
     # ---------------------------
     # Conversation mode toggle (keeps same UI behavior)
     # ---------------------------
@@ -284,6 +374,8 @@ class VoiceEnhancedInterface:
                         height=500, elem_id="medical-chatbot",
                         show_copy_button=True, bubble_full_width=False, render_markdown=True
                     )
+                    # (user, bot) raw text for Gemini, kept per browser session
+                    raw_history = gr.State([])
                     with gr.Row():
                         with gr.Column(scale=8):
                             msg = gr.Textbox(
@@ -325,20 +417,20 @@ class VoiceEnhancedInterface:
             )
 
             # Hookups (preserve original wiring)
-            msg.submit(self.user_message_handler, [msg, chatbot], [msg, chatbot], queue=False).then(
-                self.bot_response_handler, chatbot, chatbot
+            msg.submit(self.user_message_handler, [msg, chatbot, raw_history], [msg, chatbot, raw_history], queue=False).then(
+                self.bot_response_handler, [chatbot, raw_history], [chatbot, raw_history], queue=True
             )
-            send_btn.click(self.user_message_handler, [msg, chatbot], [msg, chatbot], queue=False).then(
-                self.bot_response_handler, chatbot, chatbot
+            send_btn.click(self.user_message_handler, [msg, chatbot, raw_history], [msg, chatbot, raw_history], queue=False).then(
+                self.bot_response_handler, [chatbot, raw_history], [chatbot, raw_history], queue=True
             )
 
-            # voice button: toggles recording. it returns (msg_text, chat_history)
-            voice_input_btn.click(self.handle_voice_input, [chatbot], [msg, chatbot], queue=False).then(
-                self.bot_response_handler, chatbot, chatbot
+            # voice button: toggles recording. it returns (msg_text, chat_history, raw_history)
+            voice_input_btn.click(self.handle_voice_input, [chatbot, raw_history], [msg, chatbot, raw_history], queue=False).then(
+                self.bot_response_handler, [chatbot, raw_history], [chatbot, raw_history], queue=True
             )
 
             conversation_mode_btn.click(self.toggle_conversation_mode, [], conversation_status)
-            reset_btn.click(reset_chat, [], [chatbot, msg])
+            reset_btn.click(self.reset_handler, [], [chatbot, msg, raw_history])
 
             # clicking a chat message triggers speak_selected_message
             chatbot.select(self.speak_selected_message, None, None)
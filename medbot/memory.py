@@ -10,15 +10,41 @@ except ImportError:
 
 from langchain.schema import HumanMessage, AIMessage
 from datetime import datetime
+import ahocorasick
 import json
 import re
 
+# Keywords that file a message under a patient_context category
+KEYWORD_CATEGORIES = {
+    "symptoms": [
+        "pain", "ache", "hurt", "sore", "cough", "fever", "nausea",
+        "headache", "dizzy", "tired", "fatigue", "vomit", "swollen",
+        "rash", "itch", "burn", "cramp", "bleed", "shortness of breath"
+    ],
+    "timeline": ["days", "weeks", "months", "hours", "yesterday", "today", "started", "began"],
+    "medications": ["taking", "medication", "medicine", "pills", "prescribed", "drug"],
+    "allergies": ["allergic", "allergy", "allergies", "reaction"],
+}
+
+# Only the most recent entries per category are kept for the patient summary
+MAX_CONTEXT_ENTRIES = 20
+
+_SEVERITY_RE = re.compile(r'\b([1-9]|10)\b.*(?:pain|severity|scale)')
+
 
 class MedicalMemoryManager:
     """Manages conversational context and extracts medical information."""
 
     def __init__(self, k: int = 10):
         self.conversation_memory = ConversationBufferWindowMemory(k=k, return_messages=True)
+
+        # One automaton over every keyword, so a message is scanned once
+        self._automaton = ahocorasick.Automaton()
+        for category, keywords in KEYWORD_CATEGORIES.items():
+            for keyword in keywords:
+                self._automaton.add_word(keyword, category)
+        self._automaton.make_automaton()
+
         self.reset_session()
 
     def add_interaction(self, human_input: str, ai_response: str) -> None:
@@ -30,47 +56,45 @@ class MedicalMemoryManager:
     def _extract_medical_info(self, user_input: str) -> None:
         """Extracts relevant medical details from user input."""
         user_lower = user_input.lower()
+        categories_hit = {category for _, category in self._automaton.iter(user_lower)}
 
-        # --- Symptom extraction ---
-        symptom_keywords = [
-            "pain", "ache", "hurt", "sore", "cough", "fever", "nausea",
-            "headache", "dizzy", "tired", "fatigue", "vomit", "swollen",
-            "rash", "itch", "burn", "cramp", "bleed", "shortness of breath"
-        ]
-        if any(k in user_lower for k in symptom_keywords):
-            if user_input not in self.patient_context["symptoms"]:
-                self.patient_context["symptoms"].append(user_input)
-
-        # --- Timeline extraction ---
-        time_keywords = ["days", "weeks", "months", "hours", "yesterday", "today", "started", "began"]
-        if any(k in user_lower for k in time_keywords):
-            self.patient_context["timeline"].append(user_input)
+        # --- Symptom, timeline, medication and allergy extraction ---
+        for category in categories_hit:
+            self._remember(category, user_input)
 
         # --- Severity score extraction ---
-        severity_match = re.search(r'\b([1-9]|10)\b.*(?:pain|severity|scale)', user_lower)
+        severity_match = _SEVERITY_RE.search(user_lower)
         if severity_match:
             self.patient_context["severity_scores"][datetime.now().isoformat()] = severity_match.group(1)
 
-        # --- Medication extraction ---
-        med_keywords = ["taking", "medication", "medicine", "pills", "prescribed", "drug"]
-        if any(k in user_lower for k in med_keywords):
-            self.patient_context["medications"].append(user_input)
+    def _remember(self, category: str, user_input: str) -> None:
+        """Stores a message under a category once, keeping only the latest entries."""
+        seen = self._seen[category]
+        if user_input in seen:
+            return
+        seen.add(user_input)
 
-        # --- Allergy extraction ---
-        allergy_keywords = ["allergic", "allergy", "allergies", "reaction"]
-        if any(k in user_lower for k in allergy_keywords):
-            self.patient_context["allergies"].append(user_input)
+        entries = self.patient_context[category]
+        entries.append(user_input)
+        if len(entries) > MAX_CONTEXT_ENTRIES:
+            seen.discard(entries.pop(0))
 
     def get_memory_context(self) -> str:
         """Returns the recent conversation context."""
-        messages = self.conversation_memory.chat_memory.messages[-6:]
+        all_messages = self.conversation_memory.chat_memory.messages
+        # Messages are only ever appended, so the count identifies the context
+        if self._ctx_cache[0] == len(all_messages):
+            return self._ctx_cache[1]
+
         context = []
-        for msg in messages:
+        for msg in all_messages[-6:]:
             if isinstance(msg, HumanMessage):
                 context.append(f"Patient: {msg.content}")
             elif isinstance(msg, AIMessage):
                 context.append(f"Doctor: {msg.content}")
-        return "\n".join(context)
+        result = "\n".join(context)
+        self._ctx_cache = (len(all_messages), result)
+        return result
 
     def get_patient_summary(self) -> str:
         """Returns a JSON summary of extracted patient data."""
@@ -97,3 +121,7 @@ class MedicalMemoryManager:
             "severity_scores": {},
             "session_start": datetime.now().isoformat()
         }
+        # Set mirrors of the list categories for O(1) duplicate checks
+        self._seen = {category: set() for category in KEYWORD_CATEGORIES}
+        # (message count, context) from the last get_memory_context() call
+        self._ctx_cache = (0, "")
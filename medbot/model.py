@@ -1,54 +1,100 @@
 import google.generativeai as genai
-from .config import GEMINI_API_KEY, GEMINI_MODEL
+from .config import GEMINI_API_KEY, GEMINI_MODEL, GEMINI_TRANSPORT
 import logging
+import threading
 
 class ModelManager:
     def __init__(self):
         self.model = None
+        self._load_lock = threading.Lock()
+        # GenerationConfig per (max_new_tokens, temperature, top_p)
+        self._cfg_cache = {}
+        # GenerativeModel per system instruction (see generate_chat_stream)
+        self._chat_models = {}
         
     def load(self):
         """Initialize Gemini model"""
         if self.model is not None:
             return
         
-        try:
-            # Configure Gemini API
-            genai.configure(api_key=GEMINI_API_KEY)
-            
-            # Initialize the model
-            self.model = genai.GenerativeModel(GEMINI_MODEL)
-            
-            logging.info(f"Successfully loaded Gemini model: {GEMINI_MODEL}")
+        # Concurrent requests may race to load; build the client only once so
+        # every generate/generate_stream call shares the same connection
+        with self._load_lock:
+            if self.model is not None:
+                return
             
-        except Exception as e:
-            logging.error(f"Error loading Gemini model: {e}")
-            raise Exception(f"Failed to initialize Gemini API. Please check your API key. Error: {e}")
+            try:
+                # Configure Gemini API (gRPC multiplexes concurrent requests
+                # over a single HTTP/2 channel)
+                genai.configure(api_key=GEMINI_API_KEY, transport=GEMINI_TRANSPORT)
+                
+                # Initialize the model
+                self.model = genai.GenerativeModel(GEMINI_MODEL)
+                
+                logging.info(f"Successfully loaded Gemini model: {GEMINI_MODEL}")
+                
+            except Exception as e:
+                logging.error(f"Error loading Gemini model: {e}")
+                raise Exception(f"Failed to initialize Gemini API. Please check your API key. Error: {e}")
     
-    def generate(self, prompt, max_new_tokens=1000, temperature=0.7, top_p=0.9):
+    def _generation_config(self, max_new_tokens, temperature, top_p):
+        """Return a cached GenerationConfig; respond() only uses a few combinations."""
+        key = (max_new_tokens, temperature, top_p)
+        config = self._cfg_cache.get(key)
+        if config is None:
+            config = self._cfg_cache.setdefault(key, genai.GenerationConfig(
+                temperature=temperature,
+                top_p=top_p,
+                max_output_tokens=max_new_tokens,
+            ))
+        return config
+
+    def _get_model(self, system_instruction=None):
+        """Return the shared model, or a cached one bound to a system instruction."""
+        self.load()
+        if system_instruction is None:
+            return self.model
+        model = self._chat_models.get(system_instruction)
+        if model is None:
+            model = self._chat_models.setdefault(
+                system_instruction,
+                genai.GenerativeModel(GEMINI_MODEL, system_instruction=system_instruction)
+            )
+        return model
+
+    @staticmethod
+    def _chat_contents(turns, user):
+        """Convert (user, assistant) pairs plus the new user message to Gemini contents."""
+        contents = []
+        for user_msg, assistant_msg in turns:
+            if user_msg and assistant_msg:
+                contents.append({"role": "user", "parts": [user_msg]})
+                contents.append({"role": "model", "parts": [assistant_msg]})
+        contents.append({"role": "user", "parts": [user]})
+        return contents
+
+    def generate(self, prompt, max_new_tokens=1000, temperature=0.7, top_p=0.9, system_instruction=None):
         """
         Generate response using Gemini API
         
         Args:
-            prompt: The input prompt
+            prompt: The input prompt (text or a list of multi-turn contents)
             max_new_tokens: Maximum tokens to generate (Gemini uses max_output_tokens)
             temperature: Controls randomness (0.0 to 1.0)
             top_p: Nucleus sampling parameter
+            system_instruction: Optional system prompt sent ahead of the contents
         
         Returns:
             Generated text response
         """
-        self.load()
+        model = self._get_model(system_instruction)
         
         try:
             # Configure generation parameters
-            generation_config = genai.GenerationConfig(
-                temperature=temperature,
-                top_p=top_p,
-                max_output_tokens=max_new_tokens,
-            )
+            generation_config = self._generation_config(max_new_tokens, temperature, top_p)
             
             # Generate response
-            response = self.model.generate_content(
+            response = model.generate_content(
                 prompt,
                 generation_config=generation_config
             )
@@ -57,4 +103,82 @@ class ModelManager:
             
         except Exception as e:
             logging.error(f"Error generating response: {e}")
-            return f"I apologize, but I encountered an error processing your request. Please try again or rephrase your question."
\ No newline at end of file
+            return f"I apologize, but I encountered an error processing your request. Please try again or rephrase your question."
+
+    def generate_stream(self, prompt, max_new_tokens=1000, temperature=0.7, top_p=0.9, system_instruction=None):
+        """
+        Stream a response from Gemini API chunk by chunk
+
+        Args:
+            prompt: The input prompt (text or a list of multi-turn contents)
+            max_new_tokens: Maximum tokens to generate (Gemini uses max_output_tokens)
+            temperature: Controls randomness (0.0 to 1.0)
+            top_p: Nucleus sampling parameter
+            system_instruction: Optional system prompt sent ahead of the contents
+
+        Yields:
+            Pieces of the generated text as soon as Gemini returns them
+
+        Raises:
+            Exception: If the stream fails or is blocked after some text was
+                already yielded, so the caller can drop the partial reply
+                instead of keeping it
+        """
+        model = self._get_model(system_instruction)
+        started = False
+        last_chunk = None
+
+        try:
+            generation_config = self._generation_config(max_new_tokens, temperature, top_p)
+
+            response = model.generate_content(
+                prompt,
+                generation_config=generation_config,
+                stream=True
+            )
+
+            for chunk in response:
+                last_chunk = chunk
+                # Blocked chunks and the final finish-reason chunk carry no parts,
+                # and chunk.text raises on those
+                if not chunk.parts:
+                    continue
+                started = True
+                yield chunk.text
+
+        except Exception as e:
+            logging.error(f"Error generating response: {e}")
+            if started:
+                raise
+            yield f"I apologize, but I encountered an error processing your request. Please try again or rephrase your question."
+
+        else:
+            finish_reason = None
+            if last_chunk is not None and last_chunk.candidates:
+                finish_reason = last_chunk.candidates[0].finish_reason
+            # A stream with no text, or one cut off by the safety filter, is not a reply
+            if started and finish_reason != genai.protos.Candidate.FinishReason.SAFETY:
+                return
+            logging.error(f"Gemini stream ended without a complete response (finish_reason={finish_reason!r})")
+            if started:
+                raise ValueError(f"Response was cut off (finish_reason={finish_reason!r})")
+            yield f"I apologize, but I encountered an error processing your request. Please try again or rephrase your question."
+
+    def generate_chat_stream(self, system, turns, user, **kwargs):
+        """
+        Stream a reply to a multi-turn conversation.
+
+        The system prompt is sent as the model's system instruction, so it is
+        an unchanged prefix on every call and Gemini's implicit prompt caching
+        can reuse it; only the turns that follow differ between requests.
+
+        Args:
+            system: Static system prompt
+            turns: Previous (user, assistant) exchanges
+            user: The new user message
+            **kwargs: Generation parameters passed on to generate_stream()
+
+        Yields:
+            Pieces of the generated text as soon as Gemini returns them
+        """
+        return self.generate_stream(self._chat_contents(turns, user), system_instruction=system, **kwargs)
\ No newline at end of file
@@ -1,21 +1,49 @@
-CONSULTATION_PROMPT = '''You are a professional virtual doctor. Your goal is to collect detailed information about the user's health condition, symptoms, medical history, medications, lifestyle, and other relevant data.
+import functools
+import sys
+import textwrap
+import types
 
-Ask 1-2 follow-up questions at a time to gather more details about:
-- Name and age
-- Detailed description of symptoms
-- Duration (when did it start?)
-- Severity (scale of 1-10)
-- Aggravating or alleviating factors
-- Related symptoms
-- Medical history
-- Current medications and allergies
+from langchain.prompts import PromptTemplate
 
-After collecting sufficient information (5-6 exchanges), summarize findings and suggest when they should seek professional care. Do NOT make specific diagnoses or recommend specific treatments.
+# Prompts are dedented and stripped once here; callers never need to
+# normalize their whitespace at runtime
+CONSULTATION_HEADER = sys.intern(textwrap.dedent('''You are a professional virtual doctor. Your goal is to collect detailed information about the user's health condition, symptoms, medical history, medications, lifestyle, and other relevant data.
 
-Respond empathetically and clearly. Always be professional and thorough.'''
+Ask 1-2 follow-up questions at a time to gather more details about:''').strip())
 
+# Checklist of things to ask about; variants pass a subset to build_consultation_prompt
+CONSULTATION_ITEMS = tuple(sys.intern(item) for item in (
+    "Name and age",
+    "Detailed description of symptoms",
+    "Duration (when did it start?)",
+    "Severity (scale of 1-10)",
+    "Aggravating or alleviating factors",
+    "Related symptoms",
+    "Medical history",
+    "Current medications and allergies",
+))
 
-MEDICINE_PROMPT = '''You are a specialized medical assistant. Based on the patient information gathered, provide:
+CONSULTATION_FOOTER = sys.intern(textwrap.dedent('''After collecting sufficient information (5-6 exchanges), summarize findings and suggest when they should seek professional care. Do NOT make specific diagnoses or recommend specific treatments.
+
+Respond empathetically and clearly. Always be professional and thorough.''').strip())
+
+
+@functools.lru_cache(maxsize=32)
+def _build_consultation_prompt(items):
+    if not items:
+        return sys.intern("".join((CONSULTATION_HEADER, "\n\n", CONSULTATION_FOOTER)))
+    return sys.intern("".join((CONSULTATION_HEADER, "\n- ", "\n- ".join(items), "\n\n", CONSULTATION_FOOTER)))
+
+
+def build_consultation_prompt(items=CONSULTATION_ITEMS):
+    """Assembles the consultation prompt for any sequence of checklist items."""
+    return _build_consultation_prompt(tuple(items))
+
+
+CONSULTATION_PROMPT = build_consultation_prompt()
+
+
+MEDICINE_PROMPT = textwrap.dedent('''You are a specialized medical assistant. Based on the patient information gathered, provide:
 
 1. Specific over-the-counter medicine with proper adult dosing instructions
 2. One practical home remedy that might help
@@ -23,6 +51,48 @@ MEDICINE_PROMPT = '''You are a specialized medical assistant. Based on the patie
 
 Be concise, practical, and focus only on general symptom relief and diagnosis.
 
-Patient information: {patient_info}
+Patient information: %s
+
+Previous conversation context: %s''').strip()
+
+
+# Keep one canonical copy of each prompt so comparisons and dict lookups
+# keyed on them are identity checks (build_consultation_prompt interns its own)
+MEDICINE_PROMPT = sys.intern(MEDICINE_PROMPT)
+
+# Read-only registry for selecting a prompt by mode name: PROMPTS["consult"]
+PROMPTS = types.MappingProxyType({
+    sys.intern("consult"): CONSULTATION_PROMPT,
+    sys.intern("medicine"): MEDICINE_PROMPT,
+})
+
+
+# MEDICINE_PROMPT takes (patient_info, memory_context) as positional %s
+# fields. It is split around them once at import, so rendering is a single
+# join instead of parsing the format string per request.
+_MED_HEAD, _MED_MID, _MED_TAIL = MEDICINE_PROMPT.split("%s")
+
+# Built once per process for LangChain consumers; use this instead of building
+# a PromptTemplate from MEDICINE_PROMPT per request
+MEDICINE_PROMPT_TEMPLATE = PromptTemplate.from_template(
+    "".join((_MED_HEAD, "{patient_info}", _MED_MID, "{memory_context}", _MED_TAIL)),
+    template_format="f-string"
+)
+
+
+def render_medicine_prompt(patient_info, memory_context):
+    """Equivalent to MEDICINE_PROMPT % (patient_info, memory_context)."""
+    # Not memoized: the arguments hold patient data and differ on every call
+    # str.join sizes the result from its pieces and allocates it exactly once,
+    # so there is no intermediate buffer here worth pooling
+    return "".join((_MED_HEAD, patient_info, _MED_MID, memory_context, _MED_TAIL))
+
+
+# UTF-8 forms encoded once at import for transports that send raw bytes
+CONSULTATION_PROMPT_BYTES = CONSULTATION_PROMPT.encode("utf-8")
+_MED_HEAD_B, _MED_MID_B, _MED_TAIL_B = (part.encode("utf-8") for part in (_MED_HEAD, _MED_MID, _MED_TAIL))
+
 
-Previous conversation context: {memory_context}'''
\ No newline at end of file
+def render_medicine_prompt_bytes(patient_info, memory_context):
+    """Bytes counterpart of render_medicine_prompt; both arguments are UTF-8 bytes."""
+    return b"".join((_MED_HEAD_B, patient_info, _MED_MID_B, memory_context, _MED_TAIL_B))
\ No newline at end of file